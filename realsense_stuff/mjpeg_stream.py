@@ -2,10 +2,26 @@ import pyrealsense2 as rs
 import numpy as np
 import cv2
 import os
+import re
 import json
 import threading
-import time
-from flask import Flask, Response, render_template_string
+import asyncio
+from aiohttp import web
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError) as e:
+    print(f"TurboJPEG unavailable, falling back to OpenCV: {e}")
+    jpeg = None
+
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    Gst.init(None)
+except (ImportError, ValueError):
+    Gst = None
 
 # Create a directory to store the frames
 if not os.path.exists("temp_frames"):
@@ -15,10 +31,57 @@ if not os.path.exists("temp_frames/rgb"):
 if not os.path.exists("temp_frames/depth"):
     os.makedirs("temp_frames/depth")
 
+class Camera:
+    """Latest captured frame and its MJPEG part, handed from the capture thread to every viewer
+    
+    The frame is kept as the librealsense frame object, which holds a reference
+    to its buffer, so publishing never copies pixels.
+    """
+    
+    def __init__(self):
+        self.frame = None
+        self.part = None
+        self.loop = None
+        self.event = None
+        self.stopped = False
+    
+    def publish(self, frame, jpeg):
+        """Called from the capture thread when a new frame is available"""
+        self.frame = frame
+        if not jpeg:
+            # Keep serving the last good frame if encoding failed
+            return
+        
+        # Frame the JPEG once, every viewer writes this same bytes object
+        self.part = (b'--frame\r\n'
+                     b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        if self.loop is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.notify)
+            except RuntimeError:
+                # The loop closed after the check, the server is shutting down
+                pass
+    
+    def notify(self):
+        """Runs on the event loop, wakes every viewer waiting for a frame"""
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+    
+    async def get_frame(self):
+        """Wait until a new frame arrives, return its MJPEG part, or None once the server stops"""
+        if not self.stopped:
+            await self.event.wait()
+        return None if self.stopped else self.part
+    
+    def stop(self):
+        """Runs on the event loop, releases every viewer so shutdown can finish"""
+        self.stopped = True
+        self.notify()
+
 # Global variables for streaming
-app = Flask(__name__)
-latest_frame = None
-frame_lock = threading.Lock()
+app = web.Application()
+routes = web.RouteTableDef()
+camera = Camera()
 capturing = False
 frame_count = 0
 
@@ -52,7 +115,7 @@ intrinsic_matrix = np.array([
 align_to = rs.stream.color
 
 def generate_frames():
-    global latest_frame, capturing, frame_count
+    global capturing, frame_count
     
     try:
         while True:
@@ -72,43 +135,158 @@ def generate_frames():
             # cv2.putText(color_image, f"Frames saved: {frame_count}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             # cv2.putText(color_image, f"FOV: {fov_x:.1f}° x {fov_y:.1f}°", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             
-            # Update the latest frame for streaming
-            with frame_lock:
-                latest_frame = color_image.copy()
-                
-            time.sleep(0.033)  # ~30 FPS
+            # Encode once here and share the JPEG with every viewer,
+            # wait_for_frames paces the loop
+            camera.publish(color_frame, encode_frame(color_image))
             
     except Exception as e:
         print(f"Error in frame generation: {e}")
     finally:
         pipeline.stop()
 
+class HardwareJpegEncoder:
+    """JPEG encoder running on a GStreamer hardware element"""
+    
+    def __init__(self, encoder, converter, input_format, width, height):
+        self.pipeline = Gst.parse_launch(
+            f"appsrc name=src is-live=true do-timestamp=true format=time "
+            f"caps=video/x-raw,format={input_format},width={width},height={height},framerate=30/1 "
+            f"! {converter} ! {encoder} "
+            f"! appsink name=sink sync=false max-buffers=1 drop=true"
+        )
+        self.src = self.pipeline.get_by_name('src')
+        self.sink = self.pipeline.get_by_name('sink')
+        self.lock = threading.Lock()
+        
+        # Frames arrive as BGR, pad them into a reused buffer when the converter needs BGRx
+        self.padded = np.empty((height, width, 4), dtype=np.uint8) if input_format == 'BGRx' else None
+        
+        # State changes can fail asynchronously, wait for the result
+        self.pipeline.set_state(Gst.State.PLAYING)
+        result, _, _ = self.pipeline.get_state(5 * Gst.SECOND)
+        if result == Gst.StateChangeReturn.FAILURE:
+            self.close()
+            raise RuntimeError(self.pop_error() or "pipeline failed to start")
+    
+    def encode(self, frame):
+        """Encode one frame, returns None if the pipeline produced nothing
+        
+        Callers must stop using the encoder after a None, since a late JPEG
+        could otherwise be returned for the next frame.
+        """
+        with self.lock:
+            if self.padded is not None:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self.padded)
+            self.src.emit('push-buffer', Gst.Buffer.new_wrapped(frame.tobytes()))
+            sample = self.sink.emit('try-pull-sample', Gst.SECOND)
+        
+        if sample is None:
+            return None
+        
+        buffer = sample.get_buffer()
+        return buffer.extract_dup(0, buffer.get_size())
+    
+    def pop_error(self):
+        """Return the pending pipeline error message, if any"""
+        message = self.pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+        if message is None:
+            return None
+        error, _ = message.parse_error()
+        return error.message
+    
+    def close(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+def create_hardware_encoder(width, height, quality=85):
+    """Use nvjpegenc on Jetson or the VideoCore JPEG encoder on Raspberry Pi if present"""
+    if Gst is None:
+        return None
+    
+    if Gst.ElementFactory.find('nvjpegenc'):
+        encoder = f"nvjpegenc quality={quality}"
+        # nvvidconv converts to I420 on the Jetson VIC, but it has no 3-channel BGR input
+        converter = "nvvidconv ! video/x-raw(memory:NVMM),format=I420"
+        input_format = 'BGRx'
+    elif os.path.exists('/dev/video31') and Gst.ElementFactory.find('v4l2jpegenc'):
+        # bcm2835-codec exposes its JPEG encoder as /dev/video31. videoconvert passes
+        # BGR through untouched if the encoder takes it, otherwise converts on all cores
+        encoder = f'v4l2jpegenc extra-controls="controls,compression_quality={quality}"'
+        converter = "videoconvert n-threads=0"
+        input_format = 'BGR'
+    else:
+        return None
+    
+    try:
+        hw_encoder = HardwareJpegEncoder(encoder, converter, input_format, width, height)
+        print(f"Using hardware JPEG encoder: {encoder.split()[0]}")
+        return hw_encoder
+    except Exception as e:
+        print(f"Failed to start hardware JPEG encoder: {e}")
+        return None
+
+hw_encoder = create_hardware_encoder(width, height)
+
+def check_opencv_jpeg():
+    """Warn if OpenCV's JPEG codec is known to run without libjpeg-turbo SIMD"""
+    cv2.setUseOptimized(True)
+    
+    # The JPEG line plus the SIMD lines indented beneath it
+    block = re.search(r"^( *)JPEG:[ \t]*(.+)\n((?:\1 +.*\n?)*)", cv2.getBuildInformation(), re.MULTILINE)
+    codec = block.group(2).strip() if block else "NO"
+    if codec == "NO":
+        print("WARNING: OpenCV was built without JPEG support")
+        return
+    
+    request = re.search(r"SIMD Support Request:\s*(\w+)", block.group(3))
+    simd = re.search(r"SIMD Support:\s*(\w+)", block.group(3))
+    bundled = codec.startswith("build")
+    
+    if request and request.group(1) != "YES":
+        problem = "libjpeg-turbo built with SIMD disabled"
+    elif simd and simd.group(1) != "YES":
+        problem = "libjpeg-turbo built without SIMD"
+    elif bundled and "libjpeg-turbo" in codec and simd is None:
+        problem = "libjpeg-turbo with no SIMD support reported"
+    elif bundled and "libjpeg-turbo" not in codec:
+        problem = "plain libjpeg, not libjpeg-turbo"
+    else:
+        # System libraries (e.g. .../libjpeg.so) don't report SIMD, usually libjpeg-turbo
+        print(f"OpenCV JPEG: {codec}, SIMD: {simd.group(1) if simd else 'not reported'}")
+        return
+    
+    print(f"WARNING: OpenCV JPEG is {codec} ({problem}), cv2.imencode/imwrite will be slow. "
+          f"Install PyTurboJPEG or an OpenCV wheel built with libjpeg-turbo SIMD.")
+
+# save_frame always writes through OpenCV, so check it even when streaming uses another encoder
+check_opencv_jpeg()
+
 def encode_frame(frame):
     """Encode frame as JPEG"""
+    global hw_encoder
+    
     if frame is None:
         return None
     
-    # Encode frame as JPEG
+    if hw_encoder is not None:
+        jpeg_frame = hw_encoder.encode(frame)
+        if jpeg_frame:
+            return jpeg_frame
+        
+        # Don't wait on a broken pipeline again, use software encoding from now on
+        print(f"Hardware JPEG encoder failed, switching to software: {hw_encoder.pop_error() or 'timed out'}")
+        hw_encoder.close()
+        hw_encoder = None
+    
+    # libjpeg-turbo takes BGR directly and returns bytes
+    if jpeg is not None:
+        return jpeg.encode(frame, quality=85, pixel_format=TJPF_BGR)
+    
     ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
     if not ret:
         return None
     
     return buffer.tobytes()
 
-def generate_mjpeg():
-    """Generate MJPEG stream"""
-    while True:
-        with frame_lock:
-            frame = latest_frame
-        
-        if frame is not None:
-            jpeg_frame = encode_frame(frame)
-            if jpeg_frame:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg_frame + b'\r\n')
-        
-        time.sleep(0.033)  # ~30 FPS
-
 # HTML template for the web interface
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -162,10 +340,10 @@ HTML_TEMPLATE = """
     <div class="container">
         <h1>RealSense MJPEG Stream</h1>        <div class="info">
             <p>RGB camera feed from Intel RealSense</p>
-            <p>Stream URL: <code>{{ request.url }}video_feed</code></p>
+            <p>Stream URL: <code>{{ stream_url }}</code></p>
         </div>
         <div class="stream-container">
-            <img src="{{ url_for('video_feed') }}" alt="RealSense Stream">
+            <img src="/video_feed" alt="RealSense Stream">
         </div>
         <div class="controls">
             <button onclick="toggleCapture()">Toggle Capture Mode</button>
@@ -195,49 +373,74 @@ HTML_TEMPLATE = """
 </html>
 """
 
-@app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+@routes.get('/')
+async def index(request):
+    html = HTML_TEMPLATE.replace('{{ stream_url }}', str(request.url.with_path('/video_feed')))
+    return web.Response(text=html, content_type='text/html')
 
-@app.route('/video_feed')
-def video_feed():
-    return Response(generate_mjpeg(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+@routes.get('/video_feed')
+async def video_feed(request):
+    """Stream MJPEG, every viewer shares the event loop and the encoded frames"""
+    response = web.StreamResponse(headers={'Content-Type': 'multipart/x-mixed-replace; boundary=frame'})
+    await response.prepare(request)
+    
+    try:
+        while True:
+            part = await camera.get_frame()
+            if part is None:
+                break
+            await response.write(part)
+    except ConnectionResetError:
+        pass
+    
+    return response
 
-@app.route('/toggle_capture')
-def toggle_capture():
+@routes.get('/toggle_capture')
+async def toggle_capture(request):
     global capturing
     capturing = not capturing
     print(f"Capture Mode: {'ON' if capturing else 'OFF'}")
-    return {'capturing': capturing}
+    return web.json_response({'capturing': capturing})
 
-@app.route('/save_frame')
-def save_frame():
-    global frame_count, latest_frame
+@routes.get('/save_frame')
+async def save_frame(request):
+    global frame_count
     
     if not capturing:
-        return {'message': 'Not in capture mode. Toggle capture mode ON first.'}
+        return web.json_response({'message': 'Not in capture mode. Toggle capture mode ON first.'})
     
-    with frame_lock:
-        if latest_frame is not None:
-            # Get current frames from pipeline
-            frames = pipeline.wait_for_frames()
-            
-            color_frame = frames.get_color_frame()
-            
-            if color_frame:
-                color_image = np.asanyarray(color_frame.get_data())
-                
-                # Save RGB frame only
-                cv2.imwrite(f"temp_frames/rgb/{frame_count}.jpg", color_image)
-                np.save(f"temp_frames/depth/{frame_count}_intrinsics.npy", intrinsic_matrix)
-                
-                print(f"Saved frame {frame_count}")
-                frame_count += 1
-                
-                return {'message': f'Saved frame {frame_count-1}'}
+    # Save the frame currently being streamed
+    color_frame = camera.frame
+    
+    if color_frame:
+        color_image = np.asanyarray(color_frame.get_data())
+        
+        # Claim the index before awaiting so concurrent saves don't collide
+        index = frame_count
+        frame_count += 1
+        
+        # Save RGB frame only, off the event loop so streams keep flowing
+        await asyncio.to_thread(cv2.imwrite, f"temp_frames/rgb/{index}.jpg", color_image)
+        np.save(f"temp_frames/depth/{index}_intrinsics.npy", intrinsic_matrix)
+        
+        print(f"Saved frame {index}")
+        
+        return web.json_response({'message': f'Saved frame {index}'})
     
-    return {'message': 'Failed to save frame'}
+    return web.json_response({'message': 'Failed to save frame'})
+
+async def on_startup(app):
+    # Lets the capture thread wake viewers on the event loop
+    camera.event = asyncio.Event()
+    camera.loop = asyncio.get_running_loop()
+
+async def on_shutdown(app):
+    # Viewers otherwise wait for frames forever and block shutdown
+    camera.stop()
+
+app.add_routes(routes)
+app.on_startup.append(on_startup)
+app.on_shutdown.append(on_shutdown)
 
 if __name__ == '__main__':
     # Start the frame generation thread
@@ -250,7 +453,7 @@ if __name__ == '__main__':
     print("Or access the stream directly at: http://localhost:5000/video_feed")
     
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+        web.run_app(app, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
         print("Shutting down...")
     finally:
@@ -1,19 +1,23 @@
 import asyncio
 import websockets
-import json
+import orjson
 import gzip
+import zstandard
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 import threading
 import time
-from typing import Optional, List, Tuple
+import struct
+from typing import Optional, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Must match POINT_CLOUD_HEADER and ZSTD_TAG in server.py
+POINT_CLOUD_HEADER = struct.Struct('<Id')
+ZSTD_TAG = b'\x01'
+
 class PointCloudClient:
     def __init__(self, server_url='ws://localhost:8765'):
         self.server_url = server_url
@@ -22,6 +26,12 @@ class PointCloudClient:
         self.latest_point_cloud = None
         self.lock = threading.Lock()
         self.running = False
+        self.dctx = zstandard.ZstdDecompressor()
+        
+        # Image buffers reused for every frame, projections return views of these
+        self.depth_buf = np.empty((480, 640), dtype=np.uint8)
+        self.color_buf = np.empty((480, 640, 3), dtype=np.uint8)
+        self.side_buf = np.empty((480, 640), dtype=np.uint8)
         
     async def connect(self):
         try:
@@ -36,31 +46,34 @@ class PointCloudClient:
     async def receive_messages(self):
         try:
             async for message in self.websocket:
-                try:
-                    if isinstance(message, str):
-                        try:
-                            data = json.loads(message)
-                            if data.get('type') == 'welcome':
-                                logger.info(f"Welcome message: {data.get('message')}")
-                            elif data.get('type') == 'pong':
-                                logger.debug("Received pong")
-                        except json.JSONDecodeError:
-                            logger.warning("Received non-JSON string message")
-                    else:
-                        try:
+                if isinstance(message, str):
+                    try:
+                        data = orjson.loads(message)
+                        if data.get('type') == 'welcome':
+                            logger.info(f"Welcome message: {data.get('message')}")
+                        elif data.get('type') == 'pong':
+                            logger.debug("Received pong")
+                    except orjson.JSONDecodeError:
+                        logger.warning("Received non-JSON string message")
+                else:
+                    try:
+                        if message[:1] == ZSTD_TAG:
+                            decompressed_data = self.dctx.decompress(memoryview(message)[1:])
+                        else:
+                            # Untagged messages come from servers still sending gzip
                             decompressed_data = gzip.decompress(message)
-                            point_cloud_data = json.loads(decompressed_data.decode('utf-8'))
-                            
-                            with self.lock:
-                                self.latest_point_cloud = point_cloud_data
-                            
-                            logger.info(f"Received point cloud with {len(point_cloud_data['points'])} points")
-                            
-                        except gzip.BadGzipFile:
-                            logger.warning("Received binary message that is not gzipped")
-                        except Exception as e:
-                            logger.error(f"Error processing binary message: {e}")
+                        point_cloud_data = self.decode_point_cloud(decompressed_data)
+                        
+                        with self.lock:
+                            self.latest_point_cloud = point_cloud_data
                         
+                        logger.info(f"Received point cloud with {len(point_cloud_data['points'])} points")
+                        
+                    except gzip.BadGzipFile:
+                        logger.warning("Received binary message that is neither zstd nor gzip")
+                    except Exception as e:
+                        logger.error(f"Error processing binary message: {e}")
+                    
         except websockets.exceptions.ConnectionClosed:
             logger.info("Connection closed by server")
         except Exception as e:
@@ -68,73 +81,86 @@ class PointCloudClient:
         finally:
             self.connected = False
     
-    def point_cloud_to_depth_image(self, points: List[List[float]], width: int = 640, height: int = 480) -> np.ndarray:
-        depth_image = np.zeros((height, width), dtype=np.uint8)
+    @staticmethod
+    def decode_point_cloud(data: bytes) -> dict:
+        num_points, timestamp = POINT_CLOUD_HEADER.unpack_from(data)
+        offset = POINT_CLOUD_HEADER.size
+        
+        # Views straight into the message buffer, no parsing or copying
+        points = np.frombuffer(data, dtype='<f4', count=num_points * 3, offset=offset).reshape(-1, 3)
+        offset += points.nbytes
+        colors = np.frombuffer(data, dtype=np.uint8, count=num_points * 3, offset=offset).reshape(-1, 3)
+        
+        return {
+            'points': points,
+            'colors': colors,
+            'timestamp': timestamp
+        }
+    
+    @staticmethod
+    def _blank(buf: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+        if buf.shape != shape:
+            return np.zeros(shape, dtype=buf.dtype)
+        buf.fill(0)
+        return buf
+    
+    @staticmethod
+    def _normalize(coords: np.ndarray, size: int) -> np.ndarray:
+        coords_min = coords.min()
+        scale = (size - 1) / (coords.max() - coords_min)
+        return ((coords - coords_min) * scale).astype(int)
+    
+    def point_cloud_to_depth_image(self, points: np.ndarray, width: int = 640, height: int = 480) -> np.ndarray:
+        depth_image = self._blank(self.depth_buf, (height, width))
         
-        if not points:
+        if len(points) == 0:
             return depth_image
         
-        points_array = np.array(points)
-        
-        x_coords = points_array[:, 0]
-        y_coords = points_array[:, 1]
-        z_coords = points_array[:, 2]
+        points_array = np.asarray(points, dtype=np.float32)
         
-        x_normalized = ((x_coords - x_coords.min()) / (x_coords.max() - x_coords.min()) * (width - 1)).astype(int)
-        y_normalized = ((y_coords - y_coords.min()) / (y_coords.max() - y_coords.min()) * (height - 1)).astype(int)
+        x_normalized = self._normalize(points_array[:, 0], width)
+        y_normalized = self._normalize(points_array[:, 1], height)
+        z_scaled = self._normalize(points_array[:, 2], 256)
         
-        for i in range(len(points)):
-            if 0 <= x_normalized[i] < width and 0 <= y_normalized[i] < height:
-                depth_value = int((z_coords[i] - z_coords.min()) / (z_coords.max() - z_coords.min()) * 255)
-                depth_image[y_normalized[i], x_normalized[i]] = depth_value
+        m = (x_normalized >= 0) & (x_normalized < width) & (y_normalized >= 0) & (y_normalized < height)
+        depth_image[y_normalized[m], x_normalized[m]] = z_scaled[m]
         
         return depth_image
     
-    def point_cloud_to_color_image(self, points: List[List[float]], colors: List[List[int]], width: int = 640, height: int = 480) -> np.ndarray:
-        color_image = np.zeros((height, width, 3), dtype=np.uint8)
+    def point_cloud_to_color_image(self, points: np.ndarray, colors: np.ndarray, width: int = 640, height: int = 480) -> np.ndarray:
+        color_image = self._blank(self.color_buf, (height, width, 3))
         
-        if not points or not colors:
+        if len(points) == 0 or len(colors) == 0:
             return color_image
         
-        points_array = np.array(points)
-        colors_array = np.array(colors)
-        
-        x_coords = points_array[:, 0]
-        y_coords = points_array[:, 1]
+        points_array = np.asarray(points, dtype=np.float32)
+        colors_array = np.asarray(colors, dtype=np.uint8)
         
-        x_normalized = ((x_coords - x_coords.min()) / (x_coords.max() - x_coords.min()) * (width - 1)).astype(int)
-        y_normalized = ((y_coords - y_coords.min()) / (y_coords.max() - y_coords.min()) * (height - 1)).astype(int)
+        x_normalized = self._normalize(points_array[:, 0], width)
+        y_normalized = self._normalize(points_array[:, 1], height)
         
-        for i in range(len(points)):
-            if 0 <= x_normalized[i] < width and 0 <= y_normalized[i] < height:
-                color_image[y_normalized[i], x_normalized[i]] = colors_array[i]
+        m = (x_normalized >= 0) & (x_normalized < width) & (y_normalized >= 0) & (y_normalized < height)
+        color_image[y_normalized[m], x_normalized[m]] = colors_array[m]
         
         return color_image
     
-    def create_2d_projection(self, points: List[List[float]], colors: List[List[int]], width: int = 640, height: int = 480) -> Tuple[np.ndarray, np.ndarray]:
-        if not points or not colors:
-            return np.zeros((height, width), dtype=np.uint8), np.zeros((height, width, 3), dtype=np.uint8)
+    def create_2d_projection(self, points: np.ndarray, colors: np.ndarray, width: int = 640, height: int = 480) -> Tuple[np.ndarray, np.ndarray]:
+        depth_image = self._blank(self.depth_buf, (height, width))
+        color_image = self._blank(self.color_buf, (height, width, 3))
         
-        points_array = np.array(points)
-        colors_array = np.array(colors)
+        if len(points) == 0 or len(colors) == 0:
+            return depth_image, color_image
         
-        x_coords = points_array[:, 0]
-        y_coords = points_array[:, 1]
-        z_coords = points_array[:, 2]
+        points_array = np.asarray(points, dtype=np.float32)
+        colors_array = np.asarray(colors, dtype=np.uint8)
         
-        depth_image = np.zeros((height, width), dtype=np.uint8)
+        x_normalized = self._normalize(points_array[:, 0], width)
+        z_normalized = self._normalize(points_array[:, 2], height)
+        y_scaled = self._normalize(points_array[:, 1], 256)
         
-        color_image = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        if len(x_coords) > 0:
-            x_normalized = ((x_coords - x_coords.min()) / (x_coords.max() - x_coords.min()) * (width - 1)).astype(int)
-            z_normalized = ((z_coords - z_coords.min()) / (z_coords.max() - z_coords.min()) * (height - 1)).astype(int)
-            
-            for i in range(len(points)):
-                if 0 <= x_normalized[i] < width and 0 <= z_normalized[i] < height:
-                    depth_value = int((y_coords[i] - y_coords.min()) / (y_coords.max() - y_coords.min()) * 255)
-                    depth_image[z_normalized[i], x_normalized[i]] = depth_value
-                    color_image[z_normalized[i], x_normalized[i]] = colors_array[i]
+        m = (x_normalized >= 0) & (x_normalized < width) & (z_normalized >= 0) & (z_normalized < height)
+        depth_image[z_normalized[m], x_normalized[m]] = y_scaled[m]
+        color_image[z_normalized[m], x_normalized[m]] = colors_array[m]
         
         return depth_image, color_image
     
@@ -146,7 +172,7 @@ class PointCloudClient:
             points = self.latest_point_cloud['points']
             colors = self.latest_point_cloud['colors']
             
-            if not points or not colors:
+            if len(points) == 0 or len(colors) == 0:
                 return
             
             depth_image, color_image = self.create_2d_projection(points, colors)
@@ -154,18 +180,12 @@ class PointCloudClient:
             cv2.imshow('Point Cloud - Depth View', depth_image)
             cv2.imshow('Point Cloud - Color View', color_image)
             
-            side_view = np.zeros((480, 640), dtype=np.uint8)
-            if len(points) > 0:
-                points_array = np.array(points)
-                x_coords = points_array[:, 0]
-                y_coords = points_array[:, 1]
-                
-                x_normalized = ((x_coords - x_coords.min()) / (x_coords.max() - x_coords.min()) * 639).astype(int)
-                y_normalized = ((y_coords - y_coords.min()) / (y_coords.max() - y_coords.min()) * 479).astype(int)
-                
-                for i in range(len(points)):
-                    if 0 <= x_normalized[i] < 640 and 0 <= y_normalized[i] < 480:
-                        side_view[y_normalized[i], x_normalized[i]] = 255
+            side_view = self._blank(self.side_buf, (480, 640))
+            x_normalized = self._normalize(points[:, 0], 640)
+            y_normalized = self._normalize(points[:, 1], 480)
+            
+            m = (x_normalized >= 0) & (x_normalized < 640) & (y_normalized >= 0) & (y_normalized < 480)
+            side_view[y_normalized[m], x_normalized[m]] = 255
             
             cv2.imshow('Point Cloud - Side View', side_view)
             
@@ -2,33 +2,52 @@ import websockets
 import asyncio
 import serial
 import json
+import struct
 
 ser = None
 
+# Binary drive command: left and right speed as little-endian int16
+DRIVE_PACKET = struct.Struct('<hh')
+
+# Per-packet logging, off by default since packets arrive at 50-100 Hz
+DEBUG = False
+
 async def handle_client(websocket):
     print(f"New client: {websocket.remote_address}")
     
     try:
         async for message in websocket:
-            print(f"Received from client: {message}")
-            message = message.strip() + '\n'
+            if DEBUG:
+                print(f"Received from client: {message}")
             if ser:
                 try:
-                    if (len(message.split(",")) == 2):
+                    if isinstance(message, bytes):
+                        if len(message) != DRIVE_PACKET.size:
+                            await websocket.send(f"Error: binary drive packet must be {DRIVE_PACKET.size} bytes, got {len(message)}")
+                            continue
+                        # Binary drive packet, no string parsing needed
+                        l, r = DRIVE_PACKET.unpack(message)
+                    elif len(message.split(",")) == 2:
                         l, r = message.split(",")
                         l = int(l)
                         r = int(r)
-                        print(f"L: {l}, R: {r}")
-                        if (l < 5 and l > -5):
-                            l = 0
-                            print(" -> left joystick error")
-                        if (r < 5 and r > -5):
-                            r = 0
-                            print(" -> right joystick error")
+                    else:
+                        l = r = None
+                    
+                    if l is not None:
+                        if DEBUG:
+                            print(f"L: {l}, R: {r}")
+                        # Joystick deadzone
+                        l = 0 if -5 < l < 5 else l
+                        r = 0 if -5 < r < 5 else r
                         message = f"{l},{r}\n"
-                        print(f"Message: {message}")
+                    else:
+                        message = message.strip() + '\n'
+                    
+                    # Firmware reads ASCII "L,R" lines
                     ser.write(message.encode('utf-8'))
-                    print(f"Forwarded to serial: {message}")
+                    if DEBUG:
+                        print(f"Forwarded to serial: {message}")
                 except Exception as e:
                     print(f"Error writing to serial: {e}")
                     await websocket.send(f"Error: {str(e)}")
@@ -1,14 +1,73 @@
 import pyrealsense2 as rs
 import numpy as np
-import cv2
-import json
-import gzip
+import orjson
+import zstandard
 import asyncio
 import websockets
-import threading
 import time
+import struct
 from typing import Dict, Set
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Binary point cloud frame: point count and timestamp, followed by
+# N*3 little-endian float32 XYZ and N*3 uint8 RGB
+POINT_CLOUD_HEADER = struct.Struct('<Id')
+
+# First byte of a zstd-compressed message. Older servers sent bare gzip,
+# which always starts with 0x1f, so clients can tell the two apart
+ZSTD_TAG = b'\x01'
+
+# Constant reply, serialized once instead of on every ping
+PONG_MESSAGE = orjson.dumps({'type': 'pong'}).decode()
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def deproject(depth, color, fx, fy, ppx, ppy, scale, out_pts, out_cols):
+        """Deproject every 2nd pixel of a depth frame in one fused pass.
+        
+        Each sampled row writes its valid points into its own slice of
+        out_pts/out_cols, then the slices are packed to the front. Colors
+        are converted from BGR to RGB on the way. Returns the point count.
+        """
+        height, width = depth.shape
+        rows = (height + 1) // 2
+        cols = (width + 1) // 2
+        counts = np.zeros(rows, dtype=np.int64)
+        
+        for row in prange(rows):
+            y = row * 2
+            i = row * cols
+            for x in range(0, width, 2):
+                d = depth[y, x]
+                if d > 0:
+                    z = d * scale
+                    out_pts[i, 0] = (x - ppx) * z / fx
+                    out_pts[i, 1] = (y - ppy) * z / fy
+                    out_pts[i, 2] = z
+                    out_cols[i, 0] = color[y, x, 2]
+                    out_cols[i, 1] = color[y, x, 1]
+                    out_cols[i, 2] = color[y, x, 0]
+                    i += 1
+            counts[row] = i - row * cols
+        
+        # Pack the per-row slices, destination never overtakes the source
+        total = 0
+        for row in range(rows):
+            start = row * cols
+            if start != total:
+                for k in range(counts[row]):
+                    out_pts[total + k] = out_pts[start + k]
+                    out_cols[total + k] = out_cols[start + k]
+            total += counts[row]
+        
+        return total
+else:
+    deproject = None
+
 class RealSenseStreamer:
     def __init__(self, host='0.0.0.0', port=8765):
         self.host = host
@@ -17,8 +76,13 @@ class RealSenseStreamer:
         self.pipeline = None
         self.align = None
         self.intrinsics = None
+        self.camera_params = None
+        self.depth_scale = None
+        self.deprojection_grid = None
+        self.out_pts = None
+        self.out_cols = None
         self.streaming = False
-        self.lock = threading.Lock()
+        self.cctx = zstandard.ZstdCompressor(level=1, threads=-1)
         
     def setup_realsense(self):
         try:
@@ -36,6 +100,11 @@ class RealSenseStreamer:
             color_profile = profile.get_stream(rs.stream.color).as_video_stream_profile()
             self.intrinsics = color_profile.get_intrinsics()
             
+            # Read once as plain floats instead of through pybind11 properties every frame
+            self.camera_params = (self.intrinsics.fx, self.intrinsics.fy,
+                                  self.intrinsics.ppx, self.intrinsics.ppy)
+            self.depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
+            
             # Create align object to align depth frames to color frames
             align_to = rs.stream.color
             self.align = rs.align(align_to)
@@ -47,6 +116,39 @@ class RealSenseStreamer:
             print(f"Failed to initialize RealSense: {e}")
             return False
     
+    def get_deprojection_grid(self, height, width):
+        """Per-pixel (x - ppx) / fx and (y - ppy) / fy rays for every 2nd pixel, cached across frames"""
+        shape = ((height + 1) // 2, (width + 1) // 2)
+        if self.deprojection_grid is None or self.deprojection_grid[0].shape != shape:
+            u = np.arange(0, width, 2, dtype=np.float32)
+            v = np.arange(0, height, 2, dtype=np.float32)
+            uu, vv = np.meshgrid(u, v)
+            fx, fy, ppx, ppy = self.camera_params
+            kx = (uu - ppx) / fx
+            ky = (vv - ppy) / fy
+            self.deprojection_grid = (kx, ky)
+        
+        return self.deprojection_grid
+    
+    def get_output_buffers(self, height, width):
+        """Point and color buffers sized for every 2nd pixel, reused across frames"""
+        size = ((height + 1) // 2) * ((width + 1) // 2)
+        if self.out_pts is None or len(self.out_pts) != size:
+            self.out_pts = np.empty((size, 3), dtype=np.float32)
+            self.out_cols = np.empty((size, 3), dtype=np.uint8)
+        
+        return self.out_pts, self.out_cols
+    
+    def deproject_fused(self, depth_image, color_image):
+        """Run the numba deprojection kernel into preallocated output buffers"""
+        out_pts, out_cols = self.get_output_buffers(*depth_image.shape)
+        
+        count = deproject(depth_image, color_image, *self.camera_params,
+                          self.depth_scale, out_pts, out_cols)
+        
+        # Views into the reused buffers, only valid until the next frame
+        return out_pts[:count], out_cols[:count]
+    
     def generate_point_cloud(self, depth_frame, color_frame):
         """Generate point cloud from depth and color frames"""
         try:
@@ -54,43 +156,28 @@ class RealSenseStreamer:
             depth_image = np.asanyarray(depth_frame.get_data())
             color_image = np.asanyarray(color_frame.get_data())
             
-            # Convert BGR to RGB
-            color_image = cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB)
-            
-            # Create point cloud data
             height, width = depth_image.shape
-            points = []
-            colors = []
-            
-            # Get depth scale
-            depth_scale = depth_frame.get_units()
-            
-            # Generate 3D points
-            for y in range(0, height, 2):  # Sample every 2nd pixel for performance
-                for x in range(0, width, 2):
-                    depth = depth_image[y, x]
-                    if depth > 0:
-                        # Convert depth to meters
-                        depth_meters = depth * depth_scale
-                        
-                        # Convert pixel coordinates to 3D coordinates
-                        pixel_x = x
-                        pixel_y = y
-                        
-                        # Use intrinsics to convert to 3D
-                        fx = self.intrinsics.fx
-                        fy = self.intrinsics.fy
-                        ppx = self.intrinsics.ppx
-                        ppy = self.intrinsics.ppy
-                        
-                        # Calculate 3D coordinates
-                        z = depth_meters
-                        x_3d = (pixel_x - ppx) * z / fx
-                        y_3d = (pixel_y - ppy) * z / fy
-                        
-                        # Add point and color
-                        points.append([x_3d, y_3d, z])
-                        colors.append(color_image[y, x].tolist())
+            
+            if deproject is not None:
+                points, colors = self.deproject_fused(depth_image, color_image)
+            else:
+                kx, ky = self.get_deprojection_grid(height, width)
+                
+                # Sample every 2nd pixel for performance. These are strided views,
+                # the reversed channel axis converts BGR to RGB without a copy
+                depth_sub = depth_image[::2, ::2]
+                color_sub = color_image[::2, ::2, ::-1]
+                mask = depth_sub > 0
+                
+                # Pinhole deprojection of every valid pixel at once, written
+                # straight into the reused output buffer
+                z = depth_sub[mask].astype(np.float32) * self.depth_scale
+                out_pts, _ = self.get_output_buffers(height, width)
+                points = out_pts[:len(z)]
+                np.multiply(kx[mask], z, out=points[:, 0])
+                np.multiply(ky[mask], z, out=points[:, 1])
+                points[:, 2] = z
+                colors = color_sub[mask]
             
             return {
                 'points': points,
@@ -103,13 +190,17 @@ class RealSenseStreamer:
             return None
     
     def compress_point_cloud(self, point_cloud_data):
-        """Compress point cloud data using gzip"""
+        """Pack point cloud arrays into a binary frame and compress using zstd"""
         try:
-            # Convert to JSON string
-            json_data = json.dumps(point_cloud_data)
+            points = np.ascontiguousarray(point_cloud_data['points'], dtype='<f4')
+            colors = np.ascontiguousarray(point_cloud_data['colors'], dtype=np.uint8)
+            
+            # Header followed by the raw array buffers, no per-float formatting
+            header = POINT_CLOUD_HEADER.pack(len(points), point_cloud_data['timestamp'])
+            payload = b''.join((header, points, colors))
             
-            # Compress with gzip
-            compressed_data = gzip.compress(json_data.encode('utf-8'))
+            # Compress with zstd and tag the message
+            compressed_data = ZSTD_TAG + self.cctx.compress(payload)
             
             return compressed_data
             
@@ -146,22 +237,22 @@ class RealSenseStreamer:
                     compressed_data = self.compress_point_cloud(point_cloud_data)
                     
                     if compressed_data:
-                        # Send to all connected clients
-                        with self.lock:
-                            disconnected_clients = set()
-                            for client in self.clients:
-                                try:
-                                    await client.send(compressed_data)
-                                except websockets.exceptions.ConnectionClosed:
-                                    disconnected_clients.add(client)
-                                except Exception as e:
-                                    print(f"Error sending to client: {e}")
-                                    disconnected_clients.add(client)
-                            
-                            # Remove disconnected clients
-                            self.clients -= disconnected_clients
-                            if disconnected_clients:
-                                print(f"Removed {len(disconnected_clients)} disconnected clients. Active clients: {len(self.clients)}")
+                        # Send to all connected clients. Everything runs on the event
+                        # loop thread, so iterate over a snapshot instead of locking
+                        disconnected_clients = set()
+                        for client in tuple(self.clients):
+                            try:
+                                await client.send(compressed_data)
+                            except websockets.exceptions.ConnectionClosed:
+                                disconnected_clients.add(client)
+                            except Exception as e:
+                                print(f"Error sending to client: {e}")
+                                disconnected_clients.add(client)
+                        
+                        # Remove disconnected clients
+                        self.clients -= disconnected_clients
+                        if disconnected_clients:
+                            print(f"Removed {len(disconnected_clients)} disconnected clients. Active clients: {len(self.clients)}")
                 
                 # Control frame rate
                 await asyncio.sleep(0.033)  # ~30 FPS
@@ -175,8 +266,7 @@ class RealSenseStreamer:
         client_id = id(websocket)
         print(f"New client: {client_id}")
         
-        with self.lock:
-            self.clients.add(websocket)
+        self.clients.add(websocket)
         
         try:
             welcome_msg = {
@@ -184,15 +274,16 @@ class RealSenseStreamer:
                 'message': 'hi',
                 'client_id': client_id
             }
-            await websocket.send(json.dumps(welcome_msg))
+            # Sent as text, binary frames are reserved for point clouds
+            await websocket.send(orjson.dumps(welcome_msg).decode())
             
             # Keep connection alive and handle client messages
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = orjson.loads(message)
                     if data.get('type') == 'ping':
-                        await websocket.send(json.dumps({'type': 'pong'}))
-                except json.JSONDecodeError:
+                        await websocket.send(PONG_MESSAGE)
+                except orjson.JSONDecodeError:
                     print(f"Invalid JSON from client {client_id}")
                 except Exception as e:
                     print(f"Error handling client message: {e}")
@@ -202,8 +293,7 @@ class RealSenseStreamer:
         except Exception as e:
             print(f"Error with client {client_id}: {e}")
         finally:
-            with self.lock:
-                self.clients.discard(websocket)
+            self.clients.discard(websocket)
             print(f"Client {client_id} removed. Active clients: {len(self.clients)}")
     
     async def start_server(self):
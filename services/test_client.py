@@ -1,7 +1,8 @@
 import asyncio
 import websockets
-import json
 import gzip
+import zstandard
+import struct
 import logging
 
 # Configure logging
@@ -30,9 +31,12 @@ async def test_client():
                         logger.info(f"Received binary message of size: {len(message)} bytes")
                         # Try to decompress
                         try:
-                            decompressed = gzip.decompress(message)
-                            data = json.loads(decompressed.decode('utf-8'))
-                            logger.info(f"Successfully decompressed point cloud with {len(data['points'])} points")
+                            if message[:1] == b'\x01':
+                                decompressed = zstandard.ZstdDecompressor().decompress(message[1:])
+                            else:
+                                decompressed = gzip.decompress(message)
+                            num_points, timestamp = struct.unpack_from('<Id', decompressed)
+                            logger.info(f"Successfully decompressed point cloud with {num_points} points")
                         except Exception as e:
                             logger.error(f"Failed to decompress: {e}")
                     